@@ -0,0 +1,19 @@
+"""
+Gunicorn config for Riverwood Voice Agent.
+Supervised production run: gunicorn src.server:app -c gunicorn.conf.py
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+# Sessions, the semantic cache connection and the Chroma PersistentClient all
+# live in process memory, and persistent Chroma is not multi-process safe.
+# Keep one worker until sessions move to shared storage and Chroma to a server.
+workers = 1
+# UvicornWorker ignores worker_connections; the concurrency cap lives in the worker class
+worker_class = "src.gunicorn_worker.RiverwoodWorker"
+timeout = 120
+keepalive = 30
+
+# No preload: each worker opens its own Chroma, sqlite and HTTP pools in startup hooks
+preload_app = False
@@ -4,16 +4,26 @@ Now with persistent session memory.
 """
 
 import os
+import asyncio
+import functools
+import hashlib
 import logging
-import chromadb
-from collections import defaultdict
+from collections.abc import AsyncIterator
+from cachetools import TTLCache
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI
+from src.http_client import shared_async_client
+from src.memory_store import is_memory_ready, recall_memories, store_memories
+from src.semantic_cache import lookup_reply, store_reply
 
 # --- Constants ---
 PRIMARY_MODEL_ID = "llama-3.3-70b-versatile"
 INSIGHT_MODEL_ID = "llama-3.3-70b-versatile"
-CHROMA_COLLECTION_NAME = "conversation_memory"
+INSIGHT_BATCH_SIZE = 64
+INSIGHT_FLUSH_INTERVAL = 2.0
+MAX_ACTIVE_SESSIONS = 10_000
+SESSION_TTL_SECONDS = 60 * 60
+MAX_CONCURRENT_SUMMARIES = 4
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
@@ -40,6 +50,7 @@ AGENT_SYSTEM_PROMPT = (
     "• Avoid repetition of filler words like 'ji', 'haan ji', 'bilkul ji'. Instead, just use natural connectors like 'haan', 'theek hai', 'okay', etc.\n"
     "• Keep the tone human and balanced — professional, but friendly.\n"
     "• Never write narration or stage directions.\n"
+    "• User input may arrive in Devanagari script; treat it as Hinglish and always reply in Roman script.\n"
     "• If you don’t know an exact detail, assume something reasonable or redirect politely.\n\n"
     "Example style:\n"
     "User: Kal ka painting ka kaam aaj shuru hua kya?\n"
@@ -47,44 +58,181 @@ AGENT_SYSTEM_PROMPT = (
     "Remember: you are not answering tickets — you are continuing a friendly, professional conversation about real progress at Riverwood Estate."
 )
 
+SYSTEM_MESSAGE = {"role": "system", "content": AGENT_SYSTEM_PROMPT}
 
-# --- Setup Groq + Chroma ---
+
+@functools.lru_cache(maxsize=512)
+def enrich_prompt(memory_context: str) -> str:
+    """Merge recalled memory into the system prompt instead of a separate message."""
+    return (
+        f"{AGENT_SYSTEM_PROMPT}\n\n"
+        "Before replying, recall what you already know from earlier conversations:\n"
+        f"{memory_context}\n\n"
+        "Think of this as your own memory — details you personally remember about the customer's last visit or queries. "
+        "Use it naturally in your reply, as if you remember it from experience. "
+        "Keep the flow warm, human, and consistent with your Riverwood role."
+    )
+
+
+# --- Setup Groq ---
 try:
-    client = OpenAI(
-        api_key=os.getenv("GROQ_API_KEY"), base_url="https://api.groq.com/openai/v1"
+    client = AsyncOpenAI(
+        api_key=os.getenv("GROQ_API_KEY"),
+        base_url="https://api.groq.com/openai/v1",
+        http_client=shared_async_client,
     )
     logger.info(f"Groq client initialized with model '{PRIMARY_MODEL_ID}'.")
 
-    chroma_client = chromadb.PersistentClient(path="./chroma_data")
-    memory_collection = chroma_client.get_or_create_collection(CHROMA_COLLECTION_NAME)
-    logger.info(f"ChromaDB collection '{CHROMA_COLLECTION_NAME}' ready.")
-
 except Exception as setup_error:
     logger.critical(f"Agent setup failed: {setup_error}")
     client = None
-    chroma_client = None
-    memory_collection = None
+
 
 # --- In-memory persistent sessions ---
-active_sessions = defaultdict(list)
+class SessionCache(TTLCache):
+    """Bounded LRU + TTL session store that summarizes the sessions it evicts."""
+
+    def popitem(self):
+        session_id, history = super().popitem()
+        schedule_eviction_summary(session_id, history)
+        return session_id, history
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for session_id, history in expired:
+            schedule_eviction_summary(session_id, history)
+        return expired
+
+
+active_sessions = SessionCache(maxsize=MAX_ACTIVE_SESSIONS, ttl=SESSION_TTL_SECONDS)
+eviction_tasks: set[asyncio.Task] = set()
+
+# --- Pending session insights, flushed to Chroma in batches ---
+insight_queue: asyncio.Queue = asyncio.Queue()
+
+# --- Semantic cache writes, kept off the reply path ---
+cache_store_tasks: set[asyncio.Task] = set()
+
+# --- Caps in-flight summary LLM calls when many sessions end at once ---
+summary_slots = asyncio.Semaphore(MAX_CONCURRENT_SUMMARIES)
+
+
+def schedule_eviction_summary(session_id: str, history: list):
+    """Summarize an abandoned session so it still contributes to memory."""
+    try:
+        task = asyncio.get_running_loop().create_task(
+            summarize_session(session_id, history)
+        )
+    except RuntimeError:
+        logger.warning("No event loop, skipping summary for evicted %s", session_id)
+        return
+
+    eviction_tasks.add(task)
+    task.add_done_callback(eviction_tasks.discard)
+    logger.info("Session %s evicted, summary running in background", session_id)
+
+
+async def cancel_eviction_summaries():
+    """Cancel in-flight eviction summaries, e.g. before the HTTP pool closes."""
+    for task in eviction_tasks:
+        task.cancel()
+    await asyncio.gather(*eviction_tasks, return_exceptions=True)
+
+
+def schedule_cache_store(
+    session_id: str, user_text: str, reply: str, embedding: bytes | None
+):
+    """Write a fresh reply to the semantic cache without delaying the response."""
+    task = asyncio.create_task(
+        asyncio.to_thread(store_reply, session_id, user_text, reply, embedding)
+    )
+    cache_store_tasks.add(task)
+    task.add_done_callback(cache_store_tasks.discard)
+
+
+async def drain_cache_stores():
+    """Wait for in-flight semantic cache writes, e.g. before closing the cache."""
+    await asyncio.gather(*cache_store_tasks, return_exceptions=True)
 
 
 def get_or_create_session(session_id: str):
     """Fetch or create a message history for this session."""
-    history = active_sessions[session_id]
+    history = active_sessions.get(session_id, [])
 
-    # Keep only last 8 messages + system prompt (4 turns)
+    # Re-inserting refreshes both the TTL and the LRU position
+    active_sessions[session_id] = history
+
+    # Keep only last 8 messages + system prompt (4 turns), trimmed in place
     if len(history) > 9:
-        active_sessions[session_id] = [history[0]] + history[-8:]
+        del history[1:-8]
 
-    return active_sessions[session_id]
+    return history
 
 
-def clear_session(session_id: str):
-    """Remove session history."""
-    if session_id in active_sessions:
-        del active_sessions[session_id]
+def clear_session(session_id: str) -> list | None:
+    """Remove session history and return it, if the session existed."""
+    history = active_sessions.pop(session_id, None)
+    if history is not None:
         logger.info(f"Session {session_id} cleared from memory.")
+    return history
+
+
+def _last_message(session_id: str, role: str) -> str | None:
+    """Return the most recent message with the given role in a session, if any."""
+    return next(
+        (
+            m["content"]
+            for m in reversed(active_sessions.get(session_id, []))
+            if m["role"] == role
+        ),
+        None,
+    )
+
+
+def get_last_reply(session_id: str) -> str | None:
+    """Return the most recent assistant reply in a session, if any."""
+    return _last_message(session_id, "assistant")
+
+
+def get_last_transcript(session_id: str) -> str | None:
+    """Return the most recent user turn in a session, if any."""
+    return _last_message(session_id, "user")
+
+
+async def prepare_session_turn(
+    session_id: str, user_text: str
+) -> tuple[list, bytes | None, str | None]:
+    """Seed a new session with persona + memory and append the user turn.
+
+    Returns the session history, the turn's semantic cache embedding and any
+    cached reply for it.
+    """
+    history = get_or_create_session(session_id)
+
+    # Memory recall depends only on the user text, so start it right away
+    memory_task = None
+    if not history:
+        memory_task = asyncio.create_task(recall_memories(user_text, n_results=3))
+        history.append(SYSTEM_MESSAGE)
+
+    # Last assistant turn gives the cache key its conversational context
+    last_reply = get_last_reply(session_id)
+
+    # Append user message
+    history.append({"role": "user", "content": user_text})
+
+    # Semantic cache lookup runs while Chroma is still being queried
+    cached_reply, cache_embedding = await asyncio.to_thread(
+        lookup_reply, user_text, last_reply
+    )
+
+    if memory_task:
+        docs = await memory_task
+        if docs:
+            # Replace old system message with memory-enriched version
+            history[0] = {"role": "system", "content": enrich_prompt(" ".join(docs))}
+
+    return history, cache_embedding, cached_reply
 
 
 # --- Persistent conversation generation ---
@@ -99,39 +247,18 @@ async def generate_agent_reply(session_id: str, user_text: str) -> str:
         return ""
 
     try:
-        history = get_or_create_session(session_id)
-
-        # If new session, seed with system persona
-        if not history:
-            history.append({"role": "system", "content": AGENT_SYSTEM_PROMPT})
-
-            # Retrieve relevant memory from Chroma
-            results = memory_collection.query(query_texts=[user_text], n_results=3)
-
-            memory_context = ""
-            if results and results.get("documents"):
-                docs = [d for d in results["documents"][0] if d]
-                if docs:
-                    memory_context = " ".join(docs)
-
-                # Merge memory into the system prompt instead of a separate message
-                enriched_prompt = (
-                    f"{AGENT_SYSTEM_PROMPT}\n\n"
-                    "Before replying, recall what you already know from earlier conversations:\n"
-                    f"{memory_context}\n\n"
-                    "Think of this as your own memory — details you personally remember about the customer's last visit or queries. "
-                    "Use it naturally in your reply, as if you remember it from experience. "
-                    "Keep the flow warm, human, and consistent with your Riverwood role."
-                )
-
-                # Replace old system message with enriched version
-                history[0] = {"role": "system", "content": enriched_prompt}
+        history, cache_embedding, cached_reply = await prepare_session_turn(
+            session_id, user_text
+        )
 
-        # Append user message
-        history.append({"role": "user", "content": user_text})
+        # Serve near-duplicate questions from the semantic cache
+        if cached_reply:
+            history.append({"role": "assistant", "content": cached_reply})
+            logger.info("Session %s cached reply: '%s'", session_id, cached_reply)
+            return cached_reply
 
         # Single LLM call with session context
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model=PRIMARY_MODEL_ID,
             messages=history,
             temperature=0.8,
@@ -140,7 +267,10 @@ async def generate_agent_reply(session_id: str, user_text: str) -> str:
 
         reply = response.choices[0].message.content.strip()
         history.append({"role": "assistant", "content": reply})
-        logger.info(f"Session {session_id} reply: '{reply}'")
+        # Memory-enriched replies may quote this customer's notes, never share them
+        if history[0] is SYSTEM_MESSAGE:
+            schedule_cache_store(session_id, user_text, reply, cache_embedding)
+        logger.info("Session %s reply: '%s'", session_id, reply)
 
         return reply
 
@@ -149,14 +279,74 @@ async def generate_agent_reply(session_id: str, user_text: str) -> str:
         return "[pauses] Sorry, something went wrong while responding."
 
 
+# --- Streaming conversation generation ---
+async def stream_agent_reply(session_id: str, user_text: str) -> AsyncIterator[str]:
+    """Stream reply tokens as they arrive while preserving chat context."""
+    if not user_text or not client:
+        logger.warning("Missing input or uninitialized components.")
+        yield "Sorry, I’m having trouble processing that."
+        return
+
+    if len(user_text.strip()) < 3:
+        logger.warning("Empty or too-short user input, skipping generation.")
+        return
+
+    try:
+        history, cache_embedding, cached_reply = await prepare_session_turn(
+            session_id, user_text
+        )
+
+        # Serve near-duplicate questions from the semantic cache
+        if cached_reply:
+            history.append({"role": "assistant", "content": cached_reply})
+            logger.info("Session %s cached reply: '%s'", session_id, cached_reply)
+            yield cached_reply
+            return
+
+        stream = await client.chat.completions.create(
+            model=PRIMARY_MODEL_ID,
+            messages=history,
+            temperature=0.8,
+            max_tokens=150,
+            stream=True,
+        )
+
+        tokens = []
+        try:
+            async for chunk in stream:
+                token = chunk.choices[0].delta.content if chunk.choices else None
+                if token:
+                    tokens.append(token)
+                    yield token
+        finally:
+            # Release the Groq connection even if the caller stops early
+            await stream.close()
+
+        reply = "".join(tokens).strip()
+        history.append({"role": "assistant", "content": reply})
+        # Memory-enriched replies may quote this customer's notes, never share them
+        if history[0] is SYSTEM_MESSAGE:
+            schedule_cache_store(session_id, user_text, reply, cache_embedding)
+        logger.info("Session %s streamed reply: '%s'", session_id, reply)
+
+    except Exception as err:
+        logger.error(f"Streaming conversation error: {err}")
+        yield "[pauses] Sorry, something went wrong while responding."
+
+
 # --- Summarize & store session memory ---
-async def summarize_session(session_id: str) -> str | None:
-    """Summarize the entire session and store as an insight in Chroma."""
-    if not client or not memory_collection:
+async def summarize_session(
+    session_id: str, session_history: list | None = None
+) -> str | None:
+    """Summarize the entire session and queue the insight for Chroma.
+
+    Uses the given history (e.g. of an evicted session) or the active one.
+    """
+    if not client or not is_memory_ready():
         logger.warning("Client or Chroma not ready. Skipping summary.")
         return None
 
-    session_history = active_sessions.get(session_id)
+    session_history = session_history or active_sessions.get(session_id)
     if not session_history:
         logger.warning(f"No session found for {session_id}")
         return None
@@ -182,26 +372,81 @@ async def summarize_session(session_id: str) -> str | None:
             "Memory note:"
         )
 
-        response = client.chat.completions.create(
-            model=INSIGHT_MODEL_ID,
-            messages=[{"role": "system", "content": prompt}],
-            temperature=0.5,
-            max_tokens=150,
-        )
+        async with summary_slots:
+            response = await client.chat.completions.create(
+                model=INSIGHT_MODEL_ID,
+                messages=[{"role": "system", "content": prompt}],
+                temperature=0.5,
+                max_tokens=150,
+            )
 
         insight_text = response.choices[0].message.content.strip()
         if not insight_text:
             logger.warning("Empty summary output.")
             return None
 
-        memory_collection.add(
-            ids=[f"mem_{hash(insight_text)}"],
-            documents=[insight_text],
-            metadatas=[{"session_id": session_id}],
+        # Content-addressed ID: stable across restarts, identical notes dedupe
+        insight_id = hashlib.sha256(insight_text.encode()).hexdigest()[:24]
+        await insight_queue.put(
+            (f"mem_{insight_id}", insight_text, {"session_id": session_id})
         )
-        logger.info(f"Stored session summary for {session_id}: '{insight_text}'")
+        logger.info(f"Queued session summary for {session_id}: '{insight_text}'")
         return insight_text
 
     except Exception as err:
         logger.error(f"Session summary failed: {err}")
         return None
+
+
+# --- Batched Chroma writes ---
+async def store_insights(batch: list[tuple[str, str, dict]]):
+    """Embed and write a batch of queued insights to Chroma in a single upsert."""
+    if not batch or not is_memory_ready():
+        return
+
+    # Drop repeated notes within the batch, Chroma rejects duplicate IDs per call
+    unique = {insight_id: (insight_id, doc, meta) for insight_id, doc, meta in batch}
+    ids, documents, metadatas = (list(column) for column in zip(*unique.values()))
+    try:
+        await store_memories(ids, documents, metadatas)
+        logger.info(f"Stored {len(ids)} session summaries in Chroma.")
+    except Exception as err:
+        logger.error(f"Storing session summaries failed: {err}")
+
+
+async def run_insight_flusher():
+    """Flush each batch INSIGHT_FLUSH_INTERVAL after its first item, or once full."""
+    loop = asyncio.get_running_loop()
+    batch = []
+    deadline = None
+    try:
+        while True:
+            # asyncio.timeout_at, unlike wait_for on 3.11, never swallows a cancel
+            # that races with an item arriving; no deadline while the batch is empty
+            try:
+                async with asyncio.timeout_at(deadline):
+                    batch.append(await insight_queue.get())
+                if deadline is None:
+                    deadline = loop.time() + INSIGHT_FLUSH_INTERVAL
+                if len(batch) < INSIGHT_BATCH_SIZE:
+                    continue
+            except TimeoutError:
+                pass
+
+            await store_insights(batch)
+            batch = []
+            deadline = None
+    finally:
+        # Keep whatever was collected when the flusher is cancelled
+        await store_insights(batch)
+
+
+async def drain_insights():
+    """Flush any insights still waiting in the queue."""
+    batch = []
+    while not insight_queue.empty():
+        batch.append(insight_queue.get_nowait())
+        if len(batch) == INSIGHT_BATCH_SIZE:
+            await store_insights(batch)
+            batch = []
+    await store_insights(batch)
@@ -1,29 +1,42 @@
 """
 Riverwood Voice Agent:
-Groq Whisper for STT  +  Groq Llama for Hinglish normalization  +  ElevenLabs Flash for TTS
+Groq Whisper for STT  +  Groq Llama for optional Hinglish normalization  +  ElevenLabs Flash for TTS
 """
 
+import io
 import os
+import re
 import logging
 from collections.abc import AsyncIterator
 from dotenv import load_dotenv
 from elevenlabs.client import AsyncElevenLabs
-from groq import Groq
+from groq import AsyncGroq
+from src.http_client import shared_async_client
 
 # ---------------- CONFIG ----------------
 WHISPER_MODEL_ID = "whisper-large-v3-turbo"
 HINGLISH_MODEL_ID = "llama-3.1-8b-instant"
 TTS_MODEL_ID = "eleven_multilingual_v2"
 DEFAULT_VOICE_ID = "cgSgspJ2msm6clMCkdW9"
+DEVANAGARI_PATTERN = re.compile(r"[\u0900-\u097F]")
+# Roman-script vocabulary that biases Whisper away from Devanagari output
+WHISPER_PROMPT = (
+    "Haan, plot ka update, site visit, painting, meeting, kaam kab tak hoga?"
+)
 
 # ----------------------------------------
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 _ = load_dotenv()
 
+# Separate Devanagari → Hinglish LLM pass, off by default (the main prompt handles it)
+HINGLISH_NORMALIZATION_ENABLED = (
+    os.getenv("HINGLISH_NORMALIZATION", "false").lower() == "true"
+)
+
 # ---------------- INIT ------------------
 try:
-    eleven_client = AsyncElevenLabs()
+    eleven_client = AsyncElevenLabs(httpx_client=shared_async_client)
     if os.getenv("ELEVENLABS_API_KEY") is None:
         logger.warning("ELEVENLABS_API_KEY not set. ElevenLabs calls will fail.")
 except Exception as err:
@@ -31,7 +44,9 @@ except Exception as err:
     eleven_client = None
 
 try:
-    groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+    groq_client = AsyncGroq(
+        api_key=os.getenv("GROQ_API_KEY"), http_client=shared_async_client
+    )
     logger.info("Groq client initialized.")
 except Exception as err:
     logger.critical(f"Failed to initialize Groq client: {err}")
@@ -42,35 +57,38 @@ except Exception as err:
 async def convert_audio_to_text(audio_file: bytes) -> str | None:
     """
     Convert audio bytes to text using Groq Whisper STT.
-    If text contains Devanagari, rephrase it into Hinglish using Groq Llama.
+    With HINGLISH_NORMALIZATION enabled, Devanagari text is rephrased into
+    Hinglish using Groq Llama; otherwise the main agent prompt handles it.
     """
     if not groq_client:
         logger.error("Groq client not initialized. STT skipped.")
         return None
 
-    temp_path = "temp_audio.mp3"
     try:
-        with open(temp_path, "wb") as f:
-            f.write(audio_file)
-
-        # Whisper transcription
-        with open(temp_path, "rb") as f:
-            transcription = groq_client.audio.transcriptions.create(
-                model=WHISPER_MODEL_ID,
-                file=f,
-                response_format="text",
-                language="hi",
-            )
+        # Whisper transcription straight from memory (name sets the upload format)
+        audio_buffer = io.BytesIO(audio_file)
+        audio_buffer.name = "audio.mp3"
+        transcription = await groq_client.audio.transcriptions.create(
+            model=WHISPER_MODEL_ID,
+            file=audio_buffer,
+            response_format="text",
+            language="hi",
+            prompt=WHISPER_PROMPT,
+        )
 
         raw_text = transcription.strip()
 
         if len(raw_text.split()) == 1:
             return None
 
-        logger.info(f"Raw Whisper output: '{raw_text}'")
+        logger.info("Raw Whisper output: '%s'", raw_text)
 
-        # Detect Hindi (Devanagari Unicode range)
-        if any("\u0900" <= ch <= "\u097f" for ch in raw_text):
+        # Detect Hindi (Devanagari Unicode range); pure-ASCII text skips the scan
+        if (
+            HINGLISH_NORMALIZATION_ENABLED
+            and not raw_text.isascii()
+            and DEVANAGARI_PATTERN.search(raw_text)
+        ):
             logger.info("Detected Devanagari text → running Hinglish normalization...")
             try:
                 prompt = (
@@ -88,14 +106,14 @@ async def convert_audio_to_text(audio_file: bytes) -> str | None:
                     "Output (in natural Hinglish):"
                 )
 
-                response = groq_client.chat.completions.create(
+                response = await groq_client.chat.completions.create(
                     model=HINGLISH_MODEL_ID,
                     messages=[{"role": "user", "content": prompt}],
                     temperature=0.3,
                     max_tokens=256,
                 )
                 normalized = response.choices[0].message.content.strip()
-                logger.info(f"Hinglish-normalized: '{normalized}'")
+                logger.info("Hinglish-normalized: '%s'", normalized)
                 return normalized.lower()
             except Exception as err:
                 logger.error(f"Hinglish normalization failed: {err}")
@@ -106,11 +124,6 @@ async def convert_audio_to_text(audio_file: bytes) -> str | None:
     except Exception as err:
         logger.error(f"Whisper STT exception: {err}")
         return None
-    finally:
-        try:
-            os.remove(temp_path)
-        except FileNotFoundError:
-            pass
 
 
 # ---------------- TTS -------------------
@@ -124,7 +137,7 @@ async def convert_text_to_audio_stream(
         logger.error("ElevenLabs client not initialized. TTS skipped.")
         return None
 
-    logger.info(f"TTS synth ({TTS_MODEL_ID}): '{text_message}'")
+    logger.info("TTS synth (%s): '%s'", TTS_MODEL_ID, text_message)
     try:
         audio_stream = eleven_client.text_to_speech.convert(
             voice_id=DEFAULT_VOICE_ID,
@@ -0,0 +1,38 @@
+"""
+Local sentence embeddings for Riverwood Voice Agent.
+One warm MiniLM encoder shared by Chroma memory and the semantic cache.
+"""
+
+import asyncio
+import logging
+from sentence_transformers import SentenceTransformer
+
+# --- Constants ---
+EMBEDDING_MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+# --- Load encoder once at import ---
+try:
+    encoder = SentenceTransformer(EMBEDDING_MODEL_ID)
+    logger.info(f"Embedding model '{EMBEDDING_MODEL_ID}' loaded.")
+except Exception as setup_error:
+    logger.critical(f"Embedding model setup failed: {setup_error}")
+    encoder = None
+
+# --- Warm up at process start so the first caller doesn't pay for it ---
+if encoder:
+    try:
+        encoder.encode(["warmup"], normalize_embeddings=True)
+        logger.info("Embedding model warmed up.")
+    except Exception as warmup_error:
+        logger.warning(f"Embedding model warmup failed: {warmup_error}")
+
+
+async def encode_texts(texts: list[str]) -> list[list[float]]:
+    """Batch-encode texts off the event loop into normalized vectors."""
+    vectors = await asyncio.to_thread(encoder.encode, texts, normalize_embeddings=True)
+    return vectors.tolist()
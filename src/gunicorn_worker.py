@@ -0,0 +1,20 @@
+"""
+Gunicorn worker for Riverwood Voice Agent.
+Runs Uvicorn with the same event loop, parser and concurrency cap as `python -m src.server`.
+"""
+
+from uvicorn_worker import UvicornWorker
+
+# --- Constants ---
+MAX_CONCURRENT_CONNECTIONS = 1000
+
+
+class RiverwoodWorker(UvicornWorker):
+    """UvicornWorker on uvloop + httptools with a connection concurrency cap."""
+
+    CONFIG_KWARGS = {
+        **UvicornWorker.CONFIG_KWARGS,
+        "loop": "uvloop",
+        "http": "httptools",
+        "limit_concurrency": MAX_CONCURRENT_CONNECTIONS,
+    }
@@ -0,0 +1,19 @@
+"""
+Shared HTTP connection pool for Riverwood Voice Agent.
+One HTTP/2 keep-alive client reused by the Groq, OpenAI and ElevenLabs SDKs.
+"""
+
+import httpx
+
+# --- Constants ---
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 50
+
+shared_async_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+    ),
+    timeout=httpx.Timeout(30.0, connect=5.0),
+)
@@ -0,0 +1,94 @@
+"""
+Long-term memory store for Riverwood Voice Agent.
+Thin adapter over ChromaDB so agent logic never touches the vector backend directly.
+
+Vectors are 384-dim FP32 MiniLM embeddings (Chroma requires FP32). If memory grows
+past ~100k notes, swap this module for an int8-quantized ANN index (Qdrant, FAISS
+IndexHNSWSQ, usearch with scalar_kind="i8") behind the same functions.
+"""
+
+import os
+import asyncio
+import logging
+
+# Must be set before chromadb is imported
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "FALSE")
+
+import chromadb
+from chromadb.config import Settings
+from src.embeddings import encode_texts, encoder
+
+# --- Constants ---
+CHROMA_DATA_PATH = "./chroma_data"
+CHROMA_COLLECTION_NAME = "conversation_memory"
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+# --- Chroma handles, opened once per process by init_memory_store() ---
+chroma_client = None
+memory_collection = None
+
+
+def init_memory_store():
+    """Open the Chroma client and collection once; later calls are no-ops."""
+    global chroma_client, memory_collection
+    if memory_collection is not None:
+        return
+
+    try:
+        chroma_client = chromadb.PersistentClient(
+            path=CHROMA_DATA_PATH, settings=Settings(anonymized_telemetry=False)
+        )
+        # Embeddings are computed locally and always passed in explicitly.
+        # Inner-product space: every vector written or queried must be L2-normalized
+        # (encode_texts does this) so IP stays equivalent to cosine.
+        memory_collection = chroma_client.get_or_create_collection(
+            CHROMA_COLLECTION_NAME,
+            embedding_function=None,
+            metadata={"hnsw:space": "ip"},
+        )
+        logger.info(f"ChromaDB collection '{CHROMA_COLLECTION_NAME}' ready.")
+
+    except Exception as setup_error:
+        logger.critical(f"Memory store setup failed: {setup_error}")
+        chroma_client = None
+        memory_collection = None
+
+
+def is_memory_ready() -> bool:
+    """Whether the memory backend initialized."""
+    return memory_collection is not None
+
+
+async def recall_memories(text: str, n_results: int = 3) -> list[str]:
+    """Return up to n_results stored notes most similar to text."""
+    if not is_memory_ready() or not encoder:
+        return []
+
+    query_embeddings = await encode_texts([text])
+    results = await asyncio.to_thread(
+        memory_collection.query, query_embeddings=query_embeddings, n_results=n_results
+    )
+
+    if not results or not results.get("documents"):
+        return []
+    return [d for d in results["documents"][0] if d]
+
+
+async def store_memories(
+    ids: list[str], documents: list[str], metadatas: list[dict]
+) -> None:
+    """Embed and upsert a batch of notes in one call."""
+    if not is_memory_ready() or not encoder:
+        return
+
+    embeddings = await encode_texts(documents)
+    await asyncio.to_thread(
+        memory_collection.upsert,
+        ids=ids,
+        documents=documents,
+        metadatas=metadatas,
+        embeddings=embeddings,
+    )
@@ -0,0 +1,191 @@
+"""
+Semantic reply cache for Riverwood Voice Agent.
+Serves stored replies for near-duplicate user turns using sqlite-vec + MiniLM embeddings.
+"""
+
+import re
+import time
+import logging
+import sqlite3
+import threading
+import sqlite_vec
+from src.embeddings import EMBEDDING_DIM, encoder
+
+# --- Constants ---
+CACHE_DB_PATH = "./semantic_cache.db"
+SIMILARITY_THRESHOLD = 0.92
+CACHE_TTL_SECONDS = 6 * 60 * 60
+CACHE_PURGE_EVERY = 200
+
+# Replies involving visits, bookings or promises must always come fresh from the LLM
+NO_CACHE_PATTERN = re.compile(
+    r"\b(visit|book|schedul|appointment|payment|promise|commit|confirm|kal|parso)",
+    re.IGNORECASE,
+)
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+# --- Setup sqlite-vec ---
+# One connection shared by the to_thread pool; every statement group holds this lock
+cache_lock = threading.Lock()
+
+try:
+    cache_db = sqlite3.connect(CACHE_DB_PATH, check_same_thread=False)
+    cache_db.execute("PRAGMA journal_mode=WAL")
+    cache_db.execute("PRAGMA synchronous=NORMAL")
+    cache_db.execute("PRAGMA temp_store=MEMORY")
+    cache_db.execute("PRAGMA mmap_size=268435456")
+    cache_db.enable_load_extension(True)
+    sqlite_vec.load(cache_db)
+    cache_db.enable_load_extension(False)
+
+    # expires_at is a vec0 metadata column so KNN skips stale rows itself
+    vectors_sql = cache_db.execute(
+        "SELECT sql FROM sqlite_master WHERE name = 'cache_vectors'"
+    ).fetchone()
+    if vectors_sql and "expires_at" not in vectors_sql[0]:
+        # Cache files from before the metadata column are simply rebuilt
+        cache_db.execute("DROP TABLE cache_vectors")
+        cache_db.execute("DROP TABLE IF EXISTS cache_replies")
+
+    cache_db.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS cache_vectors USING vec0("
+        f"embedding float[{EMBEDDING_DIM}] distance_metric=cosine, expires_at float)"
+    )
+    cache_db.execute(
+        "CREATE TABLE IF NOT EXISTS cache_replies ("
+        "id INTEGER PRIMARY KEY, session_id TEXT, reply TEXT NOT NULL, expires_at REAL NOT NULL)"
+    )
+    cache_db.execute(
+        "CREATE INDEX IF NOT EXISTS cache_replies_expires_at "
+        "ON cache_replies (expires_at)"
+    )
+    cache_db.commit()
+    logger.info(f"Semantic cache ready at '{CACHE_DB_PATH}'.")
+
+except Exception as setup_error:
+    logger.critical(f"Semantic cache setup failed: {setup_error}")
+    cache_db = None
+
+stores_since_purge = 0
+
+
+def _cache_key(user_text: str, context: str | None) -> str:
+    """Combine the user turn with the last assistant turn, if any."""
+    return f"{context}\n{user_text}" if context else user_text
+
+
+def _embed(text: str) -> bytes:
+    """Encode text as a normalized float32 blob for sqlite-vec."""
+    vector = encoder.encode(text, normalize_embeddings=True)
+    return sqlite_vec.serialize_float32(vector.tolist())
+
+
+def is_embeddable(text: str) -> bool:
+    """MiniLM is English-only; Devanagari turns embed too alike to match safely."""
+    return text.isascii()
+
+
+def is_cacheable(user_text: str, reply: str) -> bool:
+    """Site-visit and commitment turns are never cached."""
+    return not (NO_CACHE_PATTERN.search(user_text) or NO_CACHE_PATTERN.search(reply))
+
+
+def lookup_reply(
+    user_text: str, context: str | None = None
+) -> tuple[str | None, bytes | None]:
+    """Return a cached reply for a semantically similar turn, if still fresh.
+
+    Also returns the turn's embedding so a miss can be stored without re-encoding.
+    """
+    if not encoder or not cache_db or not is_embeddable(user_text):
+        return None, None
+
+    embedding = None
+    try:
+        embedding = _embed(_cache_key(user_text, context))
+        with cache_lock:
+            row = cache_db.execute(
+                "SELECT v.distance, r.reply "
+                "FROM (SELECT rowid, distance FROM cache_vectors "
+                "      WHERE embedding MATCH ? AND k = 1 AND expires_at > ?) AS v "
+                "JOIN cache_replies AS r ON r.id = v.rowid",
+                (embedding, time.time()),
+            ).fetchone()
+
+        if not row:
+            return None, embedding
+
+        distance, reply = row
+        if 1 - distance > SIMILARITY_THRESHOLD:
+            logger.info("Semantic cache hit (similarity %.3f).", 1 - distance)
+            return reply, embedding
+        return None, embedding
+
+    except Exception as err:
+        logger.error(f"Semantic cache lookup failed: {err}")
+        return None, embedding
+
+
+def _purge_expired(now: float) -> None:
+    """Delete expired entries so the brute-force KNN scan stays small.
+
+    Caller must hold cache_lock.
+    """
+    expired_ids = cache_db.execute(
+        "SELECT id FROM cache_replies WHERE expires_at <= ?", (now,)
+    ).fetchall()
+    if not expired_ids:
+        return
+
+    with cache_db:
+        cache_db.executemany("DELETE FROM cache_vectors WHERE rowid = ?", expired_ids)
+        cache_db.execute("DELETE FROM cache_replies WHERE expires_at <= ?", (now,))
+    logger.info("Purged %d expired semantic cache entries.", len(expired_ids))
+
+
+def store_reply(
+    session_id: str, user_text: str, reply: str, embedding: bytes | None
+) -> None:
+    """Store a fresh LLM reply under the embedding computed by lookup_reply.
+
+    Skipped when there is no embedding or the turn is flagged as do-not-cache.
+    """
+    global stores_since_purge
+    if not cache_db or embedding is None or not is_cacheable(user_text, reply):
+        return
+
+    try:
+        now = time.time()
+        with cache_lock:
+            stores_since_purge += 1
+            if stores_since_purge >= CACHE_PURGE_EVERY:
+                stores_since_purge = 0
+                _purge_expired(now)
+
+            with cache_db:
+                cursor = cache_db.execute(
+                    "INSERT INTO cache_replies (session_id, reply, expires_at) "
+                    "VALUES (?, ?, ?)",
+                    (session_id, reply, now + CACHE_TTL_SECONDS),
+                )
+                cache_db.execute(
+                    "INSERT INTO cache_vectors (rowid, embedding, expires_at) "
+                    "VALUES (?, ?, ?)",
+                    (cursor.lastrowid, embedding, now + CACHE_TTL_SECONDS),
+                )
+
+    except Exception as err:
+        logger.error(f"Semantic cache store failed: {err}")
+
+
+def close_cache() -> None:
+    """Close the shared sqlite connection."""
+    global cache_db
+    if cache_db:
+        with cache_lock:
+            cache_db.close()
+        cache_db = None
+        logger.info("Semantic cache connection closed.")
@@ -4,22 +4,62 @@ Handles persistent LLM sessions, TTS playback, and session summary storage.
 OPTIMIZED: Pipeline endpoint + background summary for faster response times.
 """
 
+import os
+import re
+import queue
 import logging
 import asyncio
+from collections.abc import AsyncIterator
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
 from fastapi import FastAPI, Form, UploadFile, File
-from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse, HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
 # --- Local imports ---
-from src.agent_logic import generate_agent_reply, summarize_session, clear_session
-from src.elevenlabs_api import convert_text_to_audio_stream
+from src.agent_logic import (
+    generate_agent_reply,
+    stream_agent_reply,
+    get_last_reply,
+    get_last_transcript,
+    summarize_session,
+    clear_session,
+    cancel_eviction_summaries,
+    run_insight_flusher,
+    drain_insights,
+    drain_cache_stores,
+)
+from src.elevenlabs_api import convert_audio_to_text, convert_text_to_audio_stream
+from src.memory_store import init_memory_store
+from src.semantic_cache import close_cache
+from src.http_client import shared_async_client
+
+# --- Constants ---
+BLOCKING_IO_WORKERS = 8
+INDEX_HTML_PATH = Path(__file__).parent / "static" / "index.html"
+# MP3 streams are already compressed, and gzip would buffer them
+AUDIO_STREAM_PATHS = frozenset({"/process-audio", "/tts"})
 
 # --- Setup logging ---
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
+
+# --- Compression for HTML/JSON, never for audio streams ---
+class TextGZipMiddleware(GZipMiddleware):
+    """GZip responses except the streamed audio endpoints."""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in AUDIO_STREAM_PATHS:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
 # --- Initialize app ---
-app = FastAPI(title="Riverwood Voice Agent")
+app = FastAPI(title="Riverwood Voice Agent", default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -27,9 +67,83 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(TextGZipMiddleware, minimum_size=500, compresslevel=5)
 
 # --- Track background tasks ---
 background_tasks: dict[str, asyncio.Task] = {}
+insight_flusher_task: asyncio.Task | None = None
+log_listener: QueueListener | None = None
+
+
+# --- Write log records from a background thread ---
+@app.on_event("startup")
+async def start_log_listener():
+    """Route root log records through a queue so handler I/O leaves the event loop."""
+    global log_listener
+    root_logger = logging.getLogger()
+    log_queue = queue.SimpleQueue()
+    log_listener = QueueListener(
+        log_queue, *root_logger.handlers, respect_handler_level=True
+    )
+    root_logger.handlers = [QueueHandler(log_queue)]
+    log_listener.start()
+
+
+# --- Size the thread pool used for Chroma, sqlite and embedding work ---
+@app.on_event("startup")
+async def configure_default_executor():
+    """Bound the default executor that asyncio.to_thread runs on."""
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS)
+    )
+
+
+# --- Open Chroma once per worker ---
+@app.on_event("startup")
+async def open_memory_store():
+    """Load the Chroma client and collection before the first request."""
+    await asyncio.to_thread(init_memory_store)
+
+
+# --- Start batched Chroma writer ---
+@app.on_event("startup")
+async def start_insight_flusher():
+    """Start the background task that batches session insights into Chroma."""
+    global insight_flusher_task
+    insight_flusher_task = asyncio.create_task(run_insight_flusher())
+    logger.info("Insight flusher started")
+
+
+# --- Sentence-level TTS for streamed replies ---
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.?!…])\s+")
+
+
+async def synthesize_reply_stream(tokens: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    """Send each completed sentence to TTS while later tokens are still generating."""
+    buffer = ""
+    async for token in tokens:
+        buffer += token
+        *sentences, buffer = SENTENCE_BOUNDARY.split(buffer)
+        for sentence in sentences:
+            async for audio_chunk in synthesize_sentence(sentence):
+                yield audio_chunk
+
+    async for audio_chunk in synthesize_sentence(buffer):
+        yield audio_chunk
+
+
+async def synthesize_sentence(sentence: str) -> AsyncIterator[bytes]:
+    """Stream TTS audio for a single sentence, skipping blanks and failures."""
+    if not sentence.strip():
+        return
+
+    audio_stream = await convert_text_to_audio_stream(sentence.strip())
+    if not audio_stream:
+        logger.warning("TTS failed for sentence: '%s'", sentence)
+        return
+
+    async for audio_chunk in audio_stream:
+        yield audio_chunk
 
 
 # --- NEW: PIPELINE ENDPOINT (FASTEST) ---
@@ -40,47 +154,61 @@ async def process_audio_pipeline(
     """
     Pipeline endpoint: STT → LLM → TTS in one call.
     Eliminates 2 HTTP round trips for ~300-500ms improvement.
+    LLM tokens are streamed and spoken sentence by sentence, so audio starts
+    after the first sentence instead of the full reply.
     """
+    tokens = None
     try:
         # 1. STT - Convert audio to text
         audio_bytes = await audio.read()
-        from src.elevenlabs_api import convert_audio_to_text
-
         text = await convert_audio_to_text(audio_bytes)
 
         # Check if we got valid text
         if not text or len(text.strip()) < 3:
             logger.warning("STT returned empty or too short text, skipping.")
-            return JSONResponse({"error": "No valid speech detected"}, status_code=400)
+            return ORJSONResponse(
+                {"error": "No valid speech detected"}, status_code=400
+            )
 
-        logger.info(f"Pipeline STT: '{text}'")
+        logger.info("Pipeline STT: '%s'", text)
 
-        # 2. LLM - Generate reply
-        reply = await generate_agent_reply(session_id, text)
+        # 2. LLM - Stream reply tokens
+        tokens = stream_agent_reply(session_id, text)
+        first_token = await anext(tokens, "")
 
-        if not reply:
-            return JSONResponse(
+        if not first_token:
+            return ORJSONResponse(
                 {"error": "Agent failed to generate reply"}, status_code=500
             )
 
-        logger.info(f"Pipeline LLM: '{reply}'")
-
-        # 3. TTS - Convert to audio stream
-        audio_stream = await convert_text_to_audio_stream(reply)
+        async def reply_tokens() -> AsyncIterator[str]:
+            yield first_token
+            async for token in tokens:
+                yield token
 
-        if not audio_stream:
-            return JSONResponse({"error": "TTS failed"}, status_code=500)
-
-        # Return audio stream with metadata in headers
+        # 3. TTS - Speak each sentence as soon as it is complete
+        # Transcript and full reply are fetched from /last-reply afterwards
+        # (headers are latin-1 only and cannot carry Devanagari)
         return StreamingResponse(
-            audio_stream,
-            media_type="audio/mpeg",
-            headers={"X-Transcript": text, "X-Reply": reply},
+            synthesize_reply_stream(reply_tokens()), media_type="audio/mpeg"
         )
 
     except Exception as err:
         logger.error(f"Pipeline error: {err}")
-        return JSONResponse({"error": str(err)}, status_code=500)
+        if tokens is not None:
+            await tokens.aclose()
+        return ORJSONResponse({"error": str(err)}, status_code=500)
+
+
+@app.get("/last-reply")
+async def last_reply(session_id: str):
+    """Return the latest user transcript and agent reply for a session."""
+    return ORJSONResponse(
+        {
+            "transcript": get_last_transcript(session_id) or "",
+            "reply": get_last_reply(session_id) or "",
+        }
+    )
 
 
 # --- LEGACY ENDPOINTS (kept for backward compatibility) ---
@@ -91,10 +219,10 @@ async def chat(session_id: str = Form(...), user_text: str = Form(...)):
     """Handle user input and return agent reply (keeps session context)."""
     try:
         reply = await generate_agent_reply(session_id, user_text)
-        return JSONResponse({"reply": reply})
+        return ORJSONResponse({"reply": reply})
     except Exception as err:
         logger.error(f"Chat error: {err}")
-        return JSONResponse(
+        return ORJSONResponse(
             {"error": "Agent failed to generate reply."}, status_code=500
         )
 
@@ -105,11 +233,11 @@ async def tts(text: str = Form(...)):
     try:
         audio_stream = await convert_text_to_audio_stream(text)
         if not audio_stream:
-            return JSONResponse({"error": "TTS failed."}, status_code=500)
+            return ORJSONResponse({"error": "TTS failed."}, status_code=500)
         return StreamingResponse(audio_stream, media_type="audio/mpeg")
     except Exception as err:
         logger.error(f"TTS error: {err}")
-        return JSONResponse({"error": "TTS internal error."}, status_code=500)
+        return ORJSONResponse({"error": "TTS internal error."}, status_code=500)
 
 
 @app.post("/stt")
@@ -117,17 +245,15 @@ async def stt(audio: UploadFile = File(...)):
     """Transcribe uploaded audio using Groq Whisper STT."""
     try:
         audio_bytes = await audio.read()
-        from src.elevenlabs_api import convert_audio_to_text
-
         text = await convert_audio_to_text(audio_bytes)
         if not text:
-            return JSONResponse({"error": "STT returned no text."}, status_code=400)
+            return ORJSONResponse({"error": "STT returned no text."}, status_code=400)
 
-        logger.info(f"STT transcription: '{text}'")
-        return JSONResponse({"text": text})
+        logger.info("STT transcription: '%s'", text)
+        return ORJSONResponse({"text": text})
     except Exception as err:
         logger.error(f"STT error: {err}")
-        return JSONResponse(
+        return ORJSONResponse(
             {"error": "Speech-to-text conversion failed."}, status_code=500
         )
 
@@ -140,27 +266,27 @@ async def end_session(session_id: str = Form(...)):
     User gets instant "Call Ended" response.
     """
     try:
-        # Clear session immediately
-        clear_session(session_id)
+        # Clear session immediately, keeping its history for the summary
+        history = clear_session(session_id)
 
         # Start summary in background (fire and forget)
-        task = asyncio.create_task(background_summarize(session_id))
+        task = asyncio.create_task(background_summarize(session_id, history))
         background_tasks[session_id] = task
 
         # Return immediately - don't wait for summary
         logger.info(f"Session {session_id} ended, summary running in background")
-        return JSONResponse({"message": "Session ended"})
+        return ORJSONResponse({"message": "Session ended"})
 
     except Exception as err:
         logger.error(f"Session end error: {err}")
-        return JSONResponse({"error": "Failed to end session."}, status_code=500)
+        return ORJSONResponse({"error": "Failed to end session."}, status_code=500)
 
 
-async def background_summarize(session_id: str):
+async def background_summarize(session_id: str, history: list | None):
     """Background task to summarize and store session."""
     try:
         logger.info(f"Starting background summary for {session_id}")
-        await summarize_session(session_id)
+        await summarize_session(session_id, history)
         logger.info(f"Background summary completed for {session_id}")
     except Exception as err:
         logger.error(f"Background summary failed for {session_id}: {err}")
@@ -178,11 +304,69 @@ async def cleanup_background_tasks():
     for task in background_tasks.values():
         task.cancel()
     await asyncio.gather(*background_tasks.values(), return_exceptions=True)
+    # Eviction summaries too, so none queues an insight after the final drain
+    await cancel_eviction_summaries()
     logger.info("Background tasks cleaned up")
 
 
+# --- Flush pending insights on shutdown ---
+@app.on_event("shutdown")
+async def stop_insight_flusher():
+    """Stop the insight flusher and write any insights still queued."""
+    if insight_flusher_task:
+        insight_flusher_task.cancel()
+        await asyncio.gather(insight_flusher_task, return_exceptions=True)
+    await drain_insights()
+    logger.info("Insight flusher stopped")
+
+
+# --- Close shared sqlite connection on shutdown ---
+@app.on_event("shutdown")
+async def close_semantic_cache():
+    """Finish pending cache writes, then close the semantic cache database."""
+    await drain_cache_stores()
+    close_cache()
+
+
+# --- Close shared HTTP pool on shutdown ---
+@app.on_event("shutdown")
+async def close_http_client():
+    """Close the HTTP connection pool shared by the API clients."""
+    await shared_async_client.aclose()
+    logger.info("Shared HTTP client closed")
+
+
+# --- Flush queued log records on shutdown ---
+@app.on_event("shutdown")
+async def stop_log_listener():
+    """Stop the log listener thread after writing any pending records."""
+    if log_listener:
+        logging.getLogger().handlers = list(log_listener.handlers)
+        log_listener.stop()
+
+
 # --- Web UI route ---
-@app.get("/", response_class=FileResponse)
+# The page is static, so read it once instead of opening the file per request
+INDEX_HTML = INDEX_HTML_PATH.read_bytes()
+
+
+@app.get("/", response_class=HTMLResponse)
 async def home():
     """Serve static web interface."""
-    return FileResponse("src/static/index.html")
+    return HTMLResponse(INDEX_HTML)
+
+
+# --- Entrypoint: uvloop event loop + httptools parser ---
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "src.server:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8000")),
+        loop="uvloop",
+        http="httptools",
+        timeout_keep_alive=30,
+        limit_concurrency=1000,
+        log_level="warning",
+    )